@@ -1,10 +1,21 @@
+import asyncio
+import fcntl
+import hashlib
+import json
 import os
+import shutil
+import statistics
 import sys
+import tempfile
+import time
 
 from collections import namedtuple
 from pathlib import Path
+
 from pytest import skip
 
+from container_ci_suite.container_lib import ContainerTestLib
+from container_ci_suite.engines.podman_wrapper import PodmanCLIWrapper
 from container_ci_suite.utils import check_variables
 
 if not check_variables():
@@ -12,6 +23,7 @@ if not check_variables():
 
 OS = os.getenv("TARGET").lower()
 VERSION = os.getenv("VERSION")
+XDIST_WORKER = os.getenv("PYTEST_XDIST_WORKER")
 IMAGE_TAG = "15-c9s"
 PGSQL_IMAGE_TAG = f"postgresql:{IMAGE_TAG}"
 DEPLOYED_PGSQL_IMAGE = f"quay.io/sclorg/postgresql-{IMAGE_TAG}"
@@ -37,10 +49,12 @@ Vars = namedtuple(
         "PGSQL_IMAGE_TAG",
         "DEPLOYED_PGSQL_IMAGE",
         "IMAGE_NAME",
+        "FULL_IMAGE",
         "IS_MINIMAL",
         "VERSION_NO_MINIMAL",
         "SHORT_VERSION",
         "TEST_DIR",
+        "WORKER_SUFFIX",
     ],
 )
 
@@ -54,13 +68,196 @@ VARS = Vars(
     PGSQL_IMAGE_TAG=PGSQL_IMAGE_TAG,
     DEPLOYED_PGSQL_IMAGE=DEPLOYED_PGSQL_IMAGE,
     IMAGE_NAME=os.getenv("IMAGE_NAME"),
+    # The full-sized image the minimal one is paired with, as in run-minimal
+    FULL_IMAGE=os.getenv("FULL_IMAGE")
+    or os.getenv("IMAGE_NAME", "").replace("-minimal:latest", ""),
     IS_MINIMAL="minimal" in VERSION,
     VERSION_NO_MINIMAL=VERSION.replace("-minimal", ""),
     SHORT_VERSION=VERSION.replace("-minimal", "").replace(".", ""),
     TEST_DIR=Path(__file__).parent.absolute(),
+    # Keeps the names of images built by the tests unique between pytest-xdist workers
+    WORKER_SUFFIX=f"-{XDIST_WORKER}" if XDIST_WORKER else "",
 )
 
 
 def skip_for_minimal():
     if "minimal" in VARS.VERSION:
         skip("This test is not available for NodeJS minimal container")
+
+
+def build_s2i_app(
+    app_path: Path, container_args: str = "", dst_image: str = "", build_args: str = ""
+) -> ContainerTestLib:
+    """
+    Build a S2I application.
+
+    build_args are passed to the container engine building the application image.
+    """
+    container_lib = ContainerTestLib(VARS.IMAGE_NAME)
+    return container_lib.build_as_df_build_args(
+        app_path=app_path,
+        s2i_args=f"--pull-policy=never {container_lib.build_s2i_npm_variables()} {container_args}",
+        src_image=VARS.IMAGE_NAME,
+        dst_image=dst_image or f"{VARS.IMAGE_NAME}-{app_path.name}{VARS.WORKER_SUFFIX}",
+        build_args=build_args,
+    )
+
+
+def s2i_app_digest(app_path: Path, container_args: str = "") -> str:
+    """
+    Hash the application sources together with the build arguments.
+    """
+    digest = hashlib.sha256(f"{VARS.IMAGE_NAME} {container_args}".encode())
+    for path in sorted(app_path.rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(app_path)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def get_s2i_app(app_path: Path, container_args: str = "") -> ContainerTestLib:
+    """
+    Get a S2I application built from app_path with container_args.
+
+    The image is built only once per test run and shared by all tests, and all
+    pytest-xdist workers, using the same sources and build arguments. Each caller
+    gets its own ContainerTestLib, so its cleanup() removes only the containers
+    it created; the shared images are removed by pytest_sessionfinish().
+    """
+    digest = s2i_app_digest(app_path, container_args)
+    state_dir = Path(os.environ["S2I_APPS_STATE_DIR"])
+    state_file = state_dir / f"{digest}.json"
+    with open(state_dir / f"{digest}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not state_file.exists():
+            s2i_app = build_s2i_app(
+                app_path,
+                container_args,
+                dst_image=f"{VARS.IMAGE_NAME}-{app_path.name}-{digest[:12]}",
+            )
+            if not s2i_app:
+                return None
+            state_file.write_text(
+                json.dumps(
+                    {
+                        "image_name": s2i_app.image_name,
+                        "app_name": s2i_app.app_name,
+                        "podman_build_log": str(s2i_app.podman_build_log),
+                    }
+                )
+            )
+        state = json.loads(state_file.read_text())
+    return ContainerTestLib(
+        state["image_name"],
+        s2i_image=True,
+        app_name=state["app_name"],
+        podman_build_log=Path(state["podman_build_log"]),
+    )
+
+
+LoadTestResult = namedtuple(
+    "LoadTestResult",
+    ["requests", "errors", "duration", "throughput", "p50", "p95", "p99"],
+)
+
+
+async def send_request(host: str, port: int, path: str) -> bool:
+    """
+    Send a HTTP GET request and read the whole response.
+
+    Return whether the response status was 200.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return status_line.split()[1:2] == [b"200"]
+
+
+async def generate_load(
+    host: str, port: int, path: str, requests: int, concurrency: int, timeout: float
+) -> LoadTestResult:
+    """
+    Send the requests from concurrency tasks and measure their latency.
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.monotonic()
+            try:
+                ok = await asyncio.wait_for(send_request(host, port, path), timeout)
+            except (OSError, asyncio.TimeoutError):
+                ok = False
+            if ok:
+                latencies.append((time.monotonic() - start) * 1000)
+            else:
+                errors += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.monotonic() - start
+    if len(latencies) > 1:
+        p50, p95, p99 = (statistics.quantiles(latencies, n=100)[i] for i in (49, 94, 98))
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return LoadTestResult(
+        requests=requests,
+        errors=errors,
+        duration=duration,
+        throughput=len(latencies) / duration,
+        p50=p50,
+        p95=p95,
+        p99=p99,
+    )
+
+
+def measure_load(
+    host: str,
+    requests: int,
+    concurrency: int,
+    timeout: float,
+    port: int = 8080,
+    path: str = "/",
+) -> LoadTestResult:
+    """
+    Send requests HTTP GET requests to an application, concurrency of them at
+    a time, each failing after timeout seconds, and return the latency
+    percentiles in milliseconds of the successful ones with the throughput in
+    requests per second.
+    """
+    return asyncio.run(generate_load(host, port, path, requests, concurrency, timeout))
+
+
+def pytest_configure(config):
+    """
+    Create the directory tracking the shared S2I application images.
+
+    It is created by the main pytest process only, pytest-xdist workers
+    inherit its location from the environment.
+    """
+    if not hasattr(config, "workerinput"):
+        os.environ["S2I_APPS_STATE_DIR"] = tempfile.mkdtemp(prefix="s2i_apps_")
+
+
+def pytest_sessionfinish(session):
+    """
+    Remove the shared S2I application images once all tests are finished.
+    """
+    if hasattr(session.config, "workerinput"):
+        return
+    state_dir = Path(os.environ["S2I_APPS_STATE_DIR"])
+    for state_file in state_dir.glob("*.json"):
+        image_name = json.loads(state_file.read_text())["image_name"]
+        PodmanCLIWrapper.call_podman_command(f"rmi -f {image_name}", ignore_error=True)
+    shutil.rmtree(state_dir, ignore_errors=True)
@@ -0,0 +1,2 @@
+#!/usr/bin/env node
+require(require('path').resolve('server.js'));
@@ -343,8 +343,8 @@ test_incremental_build() {
   ct_check_testcase_result $?
   build_log2=$(ct_s2i_build_as_df file://${test_dir}/test-incremental ${IMAGE_NAME} ${IMAGE_NAME}-testapp ${s2i_args} ${npm_variables} --incremental)
   ct_check_testcase_result $?
-  first=$(echo "$build_log1" | grep -o -e "added [0-9]* packages" | awk '{ print $2 }')
-  second=$(echo "$build_log2" | grep -o -e "added [0-9]* packages" | awk '{ print $2 }')
+  first=$(echo "$build_log1" | grep -o -e "added [0-9]* package" | awk '{ print $2 }')
+  second=$(echo "$build_log2" | grep -o -e "added [0-9]* package" | awk '{ print $2 }')
   if [ "$first" == "$second" ]; then
       echo "ERROR Incremental build failed: both builds installed $first packages"
       ct_check_testcase_result 1
@@ -0,0 +1,13 @@
+// Writes a synthetic tree of 100 directories with 1000 files each. npm ignores
+// the dot-directories of node_modules, so the tree survives the prune.
+const fs = require('fs');
+const path = require('path');
+
+const root = path.join('node_modules', '.synthetic');
+for (let d = 0; d < 100; d++) {
+  const dir = path.join(root, `package-${d}`);
+  fs.mkdirSync(dir, { recursive: true });
+  for (let f = 0; f < 1000; f++) {
+    fs.writeFileSync(path.join(dir, `file-${f}.js`), `module.exports = ${f};\n`);
+  }
+}
@@ -0,0 +1,12 @@
+var http = require('http');
+var greeting = require('offline-dep');
+var ip = process.env.OPENSHIFT_NODEJS_IP || '0.0.0.0';
+var port = process.env.PORT || process.env.port || process.env.OPENSHIFT_NODEJS_PORT || 8080;
+
+var server = http.createServer(function(req, res) {
+  res.writeHead(200);
+  res.end(greeting);
+});
+server.listen(port);
+
+console.log("Server running on " + ip + ":" + port);
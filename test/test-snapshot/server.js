@@ -0,0 +1,22 @@
+const v8 = require('v8');
+
+// Everything outside of main() is evaluated once, when the startup snapshot
+// is built, so expensive initialization belongs here.
+const greeting = 'Hello World!';
+
+function main(source) {
+  // Not all built-in modules can be part of a snapshot yet, load them at startup
+  const http = require('http');
+  const port = process.env.PORT || 8080;
+  http.createServer(function(req, res) {
+    res.writeHead(200);
+    res.end(`${greeting} Started ${source}.`);
+  }).listen(port);
+  console.log('Server running on 0.0.0.0:' + port);
+}
+
+if (v8.startupSnapshot.isBuildingSnapshot()) {
+  v8.startupSnapshot.setDeserializeMainFunction(() => main('from a startup snapshot'));
+} else {
+  main('without a startup snapshot');
+}
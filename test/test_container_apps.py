@@ -1,36 +1,31 @@
+import json
 import re
 import os
-
+import shutil
+import tempfile
+import time
 from pathlib import Path
 
 import pytest
-from container_ci_suite.container_lib import ContainerTestLib
 from container_ci_suite.engines.podman_wrapper import PodmanCLIWrapper
 
-from conftest import VARS, skip_for_minimal
+from conftest import VARS, build_s2i_app, get_s2i_app, skip_for_minimal
 
 
 test_app = VARS.TEST_DIR / "test-app"
+test_bin_start = VARS.TEST_DIR / "test-bin-start"
 test_binary = VARS.TEST_DIR / "test-binary"
 test_express_webapp = VARS.TEST_DIR / "test-express-webapp"
 test_fips = VARS.TEST_DIR / "test-fips"
 test_hw = VARS.TEST_DIR / "test-hw"
 test_incremental = VARS.TEST_DIR / "test-incremental"
+test_lockfile = VARS.TEST_DIR / "test-lockfile"
+test_offline = VARS.TEST_DIR / "test-offline"
+test_slim = VARS.TEST_DIR / "test-slim"
+test_snapshot = VARS.TEST_DIR / "test-snapshot"
 
-
-def build_s2i_app(app_path: Path, container_args: str = "") -> ContainerTestLib:
-    """
-    Build a S2I application.
-    """
-    container_lib = ContainerTestLib(VARS.IMAGE_NAME)
-    app_name = app_path.name
-    s2i_app = container_lib.build_as_df(
-        app_path=app_path,
-        s2i_args=f"--pull-policy=never {container_lib.build_s2i_npm_variables()} {container_args}",
-        src_image=VARS.IMAGE_NAME,
-        dst_image=f"{VARS.IMAGE_NAME}-{app_name}",
-    )
-    return s2i_app
+# Enough top-level entries for "/tmp/src/*" to exceed the argument list limit
+MANY_SOURCE_FILES = 60000
 
 
 class TestNodeJSAppsContainer:
@@ -42,7 +37,7 @@ class TestNodeJSAppsContainer:
         """
         Setup the test environment.
         """
-        self.s2i_app = build_s2i_app(test_app)
+        self.s2i_app = get_s2i_app(test_app)
 
     def teardown_method(self):
         """
@@ -66,23 +61,33 @@ class TestNodeJSAppsContainer:
         Test nodemon removed of a NodeJS application.
         """
         return_value = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="! test -d ./node_modules/nodemon",
             return_output=False,
         )
         assert return_value == 0
 
+    def test_start_command_resolved(self):
+        """
+        Test the start command is resolved from package.json by assemble.
+        """
+        start_command = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="cat .s2i/start-command",
+        )
+        assert start_command.strip() == "node server.js"
+
     def test_npm_cache_cleared(self):
         """
         Test npm cache cleared of a NodeJS application.
         """
         cache_loc = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="npm config get cache",
         ).strip()
         assert (
             PodmanCLIWrapper.podman_run_command_and_remove(
-                cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+                cid_file_name=self.s2i_app.image_name,
                 cmd=f"! test -d {cache_loc}",
                 return_output=False,
             )
@@ -94,7 +99,7 @@ class TestNodeJSAppsContainer:
         Test npm tmp cleared of a NodeJS application.
         """
         tmp_config = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="npm config get tmp",
         )
         assert tmp_config.strip() == "undefined"
@@ -150,6 +155,230 @@ class TestNodeJSAppsContainer:
         assert re.search("DEBUG_PORT=5858", logs)
         assert re.search(f"NODE_ENV={node_env}", logs)
 
+    @pytest.mark.parametrize(
+        "heap_args,heap_size",
+        [
+            ("", "default"),
+            ("-e NODE_HEAP_SIZE_PERCENT=75", "384"),
+            ("-e NODE_HEAP_SIZE_PERCENT=50", "256"),
+            ("-e NODE_MAX_OLD_SPACE_SIZE=300", "300"),
+            ("-e NODE_HEAP_SIZE_PERCENT=0", "default"),
+            # 50% of 512MB split between 8 workers is below the minimum
+            ("-e NODE_HEAP_SIZE_PERCENT=50 -e NODE_CLUSTER_WORKERS=8", "default"),
+        ],
+    )
+    def test_heap_size(self, heap_args, heap_size):
+        """
+        Test the V8 heap is sized from the container memory limit when asked to.
+        """
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 --memory=512m {heap_args}",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        logs = self.s2i_app.get_logs(self.s2i_app.app_name)
+        assert re.search(f"NODE_MAX_OLD_SPACE_SIZE={heap_size}", logs)
+
+    @pytest.mark.parametrize(
+        "container_args,preloaded,user_name",
+        [
+            # podman adds no passwd entry, so generate_container_user does
+            ("--passwd=false -e NSS_WRAPPER_PRELOAD=true", True, "default"),
+            ("--passwd=false -e NSS_WRAPPER_PRELOAD=false", False, "default"),
+            # podman adds the entry under a name of its own choice
+            ("-e NSS_WRAPPER_PRELOAD=false", False, None),
+        ],
+    )
+    def test_nss_wrapper_preload(self, container_args, preloaded, user_name):
+        """
+        Test an arbitrary user gets a passwd entry, and nss_wrapper is preloaded
+        for it unless disabled.
+        """
+        skip_for_minimal()
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 {container_args}",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        cid = self.s2i_app.get_cid(self.s2i_app.app_name)
+        environ = PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=cid,
+            cmd="tr \"\\0\" \"\\n\" < /proc/1/environ",
+        )
+        passwd = PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=cid, cmd="cat /etc/passwd"
+        )
+        if preloaded:
+            # Unless the user could be added to a writable /etc/passwd directly
+            assert (
+                "LD_PRELOAD=libnss_wrapper.so" in environ
+                or "default:x:100001:" in passwd
+            )
+        else:
+            assert "LD_PRELOAD=libnss_wrapper.so" not in environ
+        # Resolve the user with the nss_wrapper settings of the application,
+        # preloading it explicitly when the application does not
+        nss_env = (
+            "tr \"\\0\" \"\\n\" < /proc/1/environ"
+            " | grep -E \"^(LD_PRELOAD|NSS_WRAPPER_PASSWD|NSS_WRAPPER_GROUP)=\""
+        )
+        preload = "" if preloaded else "LD_PRELOAD=libnss_wrapper.so "
+        resolved = PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=cid, cmd=f"env $({nss_env}) {preload}id -un"
+        )
+        assert resolved
+        if user_name:
+            assert resolved.strip() == user_name
+        else:
+            assert ":100001:" in passwd
+
+    def test_container_user_after_restart(self):
+        """
+        Test an arbitrary user gets the unique name "default", and its passwd
+        entry is neither duplicated nor generated again on a restart.
+        """
+        skip_for_minimal()
+        # Without --passwd=false podman adds the user to /etc/passwd itself
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args="--user 100001 --passwd=false",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        cid = self.s2i_app.get_cid(self.s2i_app.app_name)
+        # The nss_wrapper passwd file when it was needed, /etc/passwd otherwise
+        passwd_cmd = (
+            "f=/etc/passwd; [ -f /opt/app-root/etc/passwd ] && f=/opt/app-root/etc/passwd;"
+            " grep ^default: $f; stat -c \"%i %Y\" $f"
+        )
+        passwd = PodmanCLIWrapper.podman_exec_shell_command(cid_file_name=cid, cmd=passwd_cmd)
+        assert len(passwd.splitlines()) == 2
+        assert passwd.startswith("default:x:100001:")
+        PodmanCLIWrapper.call_podman_command(f"restart {cid}")
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        assert (
+            PodmanCLIWrapper.podman_exec_shell_command(cid_file_name=cid, cmd=passwd_cmd)
+            == passwd
+        )
+
+    def test_init_wrapper_forwards_signals(self):
+        """
+        Test the init wrapper forwards signals other than SIGTERM and SIGINT
+        to the application, which exits on SIGHUP by default.
+        """
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args="--user 100001 -e INIT_WRAPPER=true -e SHUTDOWN_TIMEOUT=5",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        cid = self.s2i_app.get_cid(self.s2i_app.app_name)
+        PodmanCLIWrapper.call_podman_command(f"kill --signal HUP {cid}")
+        exit_code = PodmanCLIWrapper.call_podman_command(f"wait {cid}")
+        assert exit_code.strip() == "129"
+
+    def test_init_wrapper_shutdown_timeout(self):
+        """
+        Test the init wrapper kills an application ignoring SIGTERM once
+        SHUTDOWN_TIMEOUT has passed, long before the container engine would.
+        """
+        shutdown_timeout = 3
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 -e INIT_WRAPPER=true -e SHUTDOWN_TIMEOUT={shutdown_timeout}",
+            command="/bin/bash -c 'echo \"process.on(\\\"SIGTERM\\\", () => {})\" > /tmp/ignore-sigterm.js"
+            " && NODE_OPTIONS=\"--require /tmp/ignore-sigterm.js\" exec /usr/libexec/s2i/run'",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        cid = self.s2i_app.get_cid(self.s2i_app.app_name)
+        start = time.monotonic()
+        PodmanCLIWrapper.call_podman_command(f"stop -t 30 {cid}")
+        stop_time = time.monotonic() - start
+        exit_code = PodmanCLIWrapper.call_podman_command(
+            f"inspect --format '{{{{.State.ExitCode}}}}' {cid}"
+        )
+        assert exit_code.strip() == "137"
+        assert shutdown_timeout <= stop_time < shutdown_timeout + 10
+
+    @pytest.mark.parametrize(
+        "cluster_args,workers",
+        [
+            ("-e NODE_CLUSTER_WORKERS=2 -e INIT_WRAPPER=true", "2"),
+            ("-e NODE_CLUSTER_WORKERS=2 -e INIT_WRAPPER=false", "2"),
+            ("--cpus=1 -e NODE_CLUSTER_WORKERS=auto", "1"),
+        ],
+    )
+    def test_cluster_workers(self, cluster_args, workers):
+        """
+        Test the application is run in NODE_CLUSTER_WORKERS cluster workers.
+        """
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 {cluster_args}",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        logs = self.s2i_app.get_logs(self.s2i_app.app_name)
+        assert re.search(f"NODE_CLUSTER_WORKERS={workers}", logs)
+        assert re.search(f"Starting {workers} cluster workers", logs)
+
+    def test_cluster_worker_restarted(self):
+        """
+        Test a crashed cluster worker is replaced, and SIGTERM drains the
+        workers so that the container stops on its own.
+        """
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args="--user 100001 -e NODE_CLUSTER_WORKERS=2",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        cid = self.s2i_app.get_cid(self.s2i_app.app_name)
+        # The supervisor runs as PID 1, the workers are its children
+        workers_cmd = (
+            "for stat in /proc/[0-9]*/stat; do"
+            " read -r pid comm state ppid rest < $stat 2>/dev/null"
+            " && [ $ppid = 1 ] && echo $pid; done; true"
+        )
+        workers = PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=cid, cmd=workers_cmd
+        ).split()
+        assert len(workers) == 2
+        PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=cid, cmd=f"kill -s KILL {workers[0]}"
+        )
+        for _ in range(10):
+            time.sleep(1)
+            restarted = PodmanCLIWrapper.podman_exec_shell_command(
+                cid_file_name=cid, cmd=workers_cmd
+            ).split()
+            if len(restarted) == 2:
+                break
+        assert len(restarted) == 2
+        assert workers[0] not in restarted
+        assert workers[1] in restarted
+        logs = self.s2i_app.get_logs(self.s2i_app.app_name)
+        assert f"Cluster worker {workers[0]} exited (SIGKILL), restarting it" in logs
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        start = time.monotonic()
+        PodmanCLIWrapper.call_podman_command(f"stop -t 30 {cid}")
+        assert time.monotonic() - start < 10
+        exit_code = PodmanCLIWrapper.call_podman_command(
+            f"inspect --format '{{{{.State.ExitCode}}}}' {cid}"
+        )
+        assert exit_code.strip() == "0"
+
     @pytest.mark.parametrize(
         "node_env,init_wrapper",
         [
@@ -186,7 +415,7 @@ class TestNodeJSAppsWithDevModeTrueContainer:
         """
         Setup the test environment.
         """
-        self.s2i_app = build_s2i_app(test_app, container_args="-e DEV_MODE=true")
+        self.s2i_app = get_s2i_app(test_app, container_args="-e DEV_MODE=true")
 
     def teardown_method(self):
         """
@@ -210,7 +439,7 @@ class TestNodeJSAppsWithDevModeTrueContainer:
         Test nodemon present of a NodeJS application.
         """
         return_value = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="test -d ./node_modules/nodemon",
             return_output=False,
         )
@@ -221,12 +450,12 @@ class TestNodeJSAppsWithDevModeTrueContainer:
         Test npm cache exist of a NodeJS application.
         """
         cache_loc = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="npm config get cache",
         ).strip()
         assert (
             PodmanCLIWrapper.podman_run_command_and_remove(
-                cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+                cid_file_name=self.s2i_app.image_name,
                 cmd=f"test -d {cache_loc}",
                 return_output=False,
             )
@@ -293,7 +522,7 @@ class TestNodeJSAppsWithNodeEnvDevelopmentContainer:
         """
         Setup the test environment.
         """
-        self.s2i_app = build_s2i_app(test_app, container_args="-e NODE_ENV=development")
+        self.s2i_app = get_s2i_app(test_app, container_args="-e NODE_ENV=development")
 
     def teardown_method(self):
         """
@@ -317,7 +546,7 @@ class TestNodeJSAppsWithNodeEnvDevelopmentContainer:
         Test nodemon present of a NodeJS application.
         """
         return_value = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="test -d ./node_modules/nodemon",
             return_output=False,
         )
@@ -328,12 +557,12 @@ class TestNodeJSAppsWithNodeEnvDevelopmentContainer:
         Test npm cache exist of a NodeJS application.
         """
         cache_loc = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="npm config get cache",
         ).strip()
         assert (
             PodmanCLIWrapper.podman_run_command_and_remove(
-                cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+                cid_file_name=self.s2i_app.image_name,
                 cmd=f"test -d {cache_loc}",
                 return_output=False,
             )
@@ -398,7 +627,7 @@ class TestNodeJSAppsHWContainer:
         """
         http_proxy = "http://user.password@0.0.0.0:8080"
         https_proxy = "https://user.password@0.0.0.0:8080"
-        self.s2i_app = build_s2i_app(
+        self.s2i_app = get_s2i_app(
             test_hw,
             container_args=f"-e HTTP_PROXY={http_proxy} -e http_proxy={http_proxy} "
             f"-e HTTPS_PROXY={https_proxy} -e https_proxy={https_proxy}",
@@ -464,17 +693,122 @@ class TestNodeJSAppsHWContainer:
         assert "redacted" in podman_log_file
 
 
+class TestNodeJSManySourceFilesAppContainer:
+    """
+    Test a NodeJS application with many checked-in source files.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.app_dir = tempfile.mkdtemp()
+        app_path = Path(self.app_dir) / "test-many-sources"
+        shutil.copytree(test_hw, app_path)
+        for i in range(MANY_SOURCE_FILES):
+            (app_path / f"checked-in-asset-{i:05}.txt").write_text(f"{i}\n")
+        self.s2i_app = build_s2i_app(app_path)
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+        shutil.rmtree(self.app_dir)
+
+    def test_many_source_files(self):
+        """
+        Test all the source files are installed and /tmp/src is left empty.
+        """
+        output = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="ls | grep -c ^checked-in-asset-; ls -A /tmp/src | wc -l",
+        )
+        assert output.split() == [str(MANY_SOURCE_FILES), "0"]
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}", expected_output="Hello World!")
+
+
 class TestNodeJSIncrementalAppContainer:
     """
     Test incremental build of a NodeJS application.
     """
 
+    @classmethod
+    def setup_class(cls):
+        """
+        Setup the test environment, shared by all tests of the class.
+        """
+        cls.build1 = build_s2i_app(test_incremental)
+        cls.build2 = build_s2i_app(test_incremental, container_args="--incremental")
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Cleanup the test environment.
+        """
+        cls.build1.cleanup()
+        cls.build2.cleanup()
+
+    def test_incremental_build(self):
+        """
+        Test incremental build of a NodeJS application.
+        """
+        skip_for_minimal()
+        build_log1 = self.build1.get_podman_build_log_file()
+        build_log2 = self.build2.get_podman_build_log_file()
+        assert build_log1 != build_log2
+
+    def test_compressed_artifacts(self):
+        """
+        Test that compressed artifacts transfer fewer bytes than
+        the plain tar stream and measure how long they take to unpack.
+        """
+        skip_for_minimal()
+        unpack_artifacts = (
+            "/usr/libexec/s2i/save-artifacts > /tmp/artifacts.tar && "
+            "stat -c %s /tmp/artifacts.tar && mkdir /tmp/artifacts && "
+            "start=$(date +%s%N) && tar -C /tmp/artifacts -xf /tmp/artifacts.tar && "
+            "if [ -f /tmp/artifacts/artifacts.manifest ]; then "
+            "tar -I $(sed -n s/^compression=//p /tmp/artifacts/artifacts.manifest) "
+            "-C /tmp/artifacts -xf /tmp/artifacts/artifacts.tar.*; fi && "
+            "test -d /tmp/artifacts/node_modules && "
+            "echo $(( ($(date +%s%N) - start) / 1000000 ))"
+        )
+        results = {}
+        for compression in ("none", "auto"):
+            output = PodmanCLIWrapper.podman_run_command(
+                f"--rm -e ARTIFACTS_COMPRESSION={compression} "
+                f"{self.build2.image_name} "
+                f"/bin/bash -c '{unpack_artifacts}'"
+            )
+            size, restore_ms = output.strip().splitlines()[-2:]
+            results[compression] = (int(size), int(restore_ms))
+            print(
+                f"ARTIFACTS_COMPRESSION={compression}: {size} bytes transferred, "
+                f"restored in {restore_ms} ms"
+            )
+        assert results["auto"][0] < results["none"][0]
+
+
+class TestNodeJSLockfileIncrementalAppContainer:
+    """
+    Test incremental build of a NodeJS application with a lockfile.
+    """
+
     def setup_method(self):
         """
         Setup the test environment.
         """
-        self.build1 = build_s2i_app(test_incremental)
-        self.build2 = build_s2i_app(test_incremental, container_args="--incremental")
+        self.build1 = build_s2i_app(test_lockfile)
+        self.build2 = build_s2i_app(test_lockfile, container_args="--incremental")
+        self.build3 = None
+        self.build4 = None
+        self.app_dir = tempfile.mkdtemp()
 
     def teardown_method(self):
         """
@@ -482,15 +816,551 @@ class TestNodeJSIncrementalAppContainer:
         """
         self.build1.cleanup()
         self.build2.cleanup()
+        if self.build3:
+            self.build3.cleanup()
+        if self.build4:
+            self.build4.cleanup()
+        shutil.rmtree(self.app_dir)
 
-    def test_incremental_build(self):
+    def test_dependencies_reused(self):
         """
-        Test incremental build of a NodeJS application.
+        Test that npm install is skipped when the restored
+        dependencies match the lockfile.
         """
         skip_for_minimal()
+        reuse_message = "Restored dependencies match the lockfile, reusing them"
         build_log1 = self.build1.get_podman_build_log_file()
         build_log2 = self.build2.get_podman_build_log_file()
-        assert build_log1 != build_log2
+        assert reuse_message not in build_log1
+        assert reuse_message in build_log2
+        assert "---> Installing all dependencies" not in build_log2
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.build2.image_name,
+                cmd="test -f ./node_modules/yarn/package.json",
+                return_output=False,
+            )
+            == 0
+        )
+
+    def test_dependencies_changed_without_lockfile(self):
+        """
+        Test that the restored dependencies are not reused when a dependency
+        was added to package.json without regenerating the lockfile.
+        """
+        skip_for_minimal()
+        # Keep the name, so that the build is incremental to the previous ones
+        app_path = Path(self.app_dir) / test_lockfile.name
+        shutil.copytree(test_lockfile, app_path)
+        package = json.loads((app_path / "package.json").read_text())
+        package["dependencies"]["ms"] = "2.1.3"
+        (app_path / "package.json").write_text(json.dumps(package))
+        self.build3 = build_s2i_app(app_path, container_args="--incremental")
+        build_log = self.build3.get_podman_build_log_file()
+        assert "Restored dependencies do not match the lockfile, removing them" in build_log
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.build3.image_name,
+                cmd="test -f ./node_modules/ms/package.json",
+                return_output=False,
+            )
+            == 0
+        )
+
+    def test_compressed_artifacts_restored(self):
+        """
+        Test that assemble restores the compressed artifacts handed over by
+        save-artifacts, and reuses the dependencies they contain.
+        """
+        skip_for_minimal()
+        # save-artifacts runs in the previous image, which has to compress
+        dst_image = f"{VARS.IMAGE_NAME}-test-lockfile-compressed{VARS.WORKER_SUFFIX}"
+        self.build3 = build_s2i_app(
+            test_lockfile,
+            container_args="-e ARTIFACTS_COMPRESSION=gzip",
+            dst_image=dst_image,
+        )
+        self.build4 = build_s2i_app(
+            test_lockfile,
+            container_args="--incremental -e ARTIFACTS_COMPRESSION=gzip",
+            dst_image=dst_image,
+        )
+        build_log = self.build4.get_podman_build_log_file()
+        assert "---> Restoring previous build artifacts" in build_log
+        assert "Unsupported artifacts compression" not in build_log
+        assert "Restored dependencies match the lockfile, reusing them" in build_log
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.build4.image_name,
+                cmd="test -f ./node_modules/yarn/package.json"
+                " && test ! -e /tmp/artifacts/artifacts.manifest",
+                return_output=False,
+            )
+            == 0
+        )
+
+    @pytest.mark.parametrize(
+        "install_args",
+        [
+            "-e NPM_SLIM=true",
+            "-e NPM_INSTALL_MODE=ci",
+        ],
+    )
+    def test_dependencies_installed_differently(self, install_args):
+        """
+        Test that the restored dependencies are not reused when they are to be
+        installed or slimmed differently than in the previous build.
+        """
+        skip_for_minimal()
+        self.build3 = build_s2i_app(
+            test_lockfile, container_args=f"--incremental {install_args}"
+        )
+        build_log = self.build3.get_podman_build_log_file()
+        assert "Restored dependencies do not match the lockfile, removing them" in build_log
+
+
+class TestNodeJSNpmCiAppContainer:
+    """
+    Test NPM_INSTALL_MODE=ci of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(
+            test_lockfile, container_args="-e NPM_INSTALL_MODE=ci"
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_npm_ci_keeps_lockfile(self):
+        """
+        Test that npm ci installs the dependencies without rewriting the lockfile
+        and without pruning the development dependencies afterwards.
+        """
+        build_log = self.s2i_app.get_podman_build_log_file()
+        assert "---> Installing production dependencies" in build_log
+        assert "---> Pruning the development dependencies" not in build_log
+        lockfile = (test_lockfile / "package-lock.json").read_text()
+        image_lockfile = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="cat package-lock.json",
+        )
+        assert image_lockfile.strip() == lockfile.strip()
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+
+
+class TestNodeJSOfflineBundleAppContainer:
+    """
+    Test NPM_OFFLINE_BUNDLE of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = build_s2i_app(
+            test_offline,
+            container_args="-e NPM_OFFLINE_BUNDLE=offline-bundle",
+            build_args="--network=none",
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_offline_install(self):
+        """
+        Test the dependencies are installed from the offline bundle
+        by a build without network access.
+        """
+        build_log = self.s2i_app.get_podman_build_log_file()
+        assert "---> Installing the dependencies offline from offline-bundle" in build_log
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(
+            url=f"http://{cip}", expected_output="Hello from the offline bundle!"
+        )
+
+
+class TestNodeJSSlimAppContainer:
+    """
+    Test NPM_SLIM of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(test_slim, container_args="-e NPM_SLIM=true")
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_slim_keeps_packages(self):
+        """
+        Test a dependency named like a NPM_SLIM pattern is kept, while its
+        files not needed at runtime are removed.
+        """
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_app.image_name,
+                cmd="test -f node_modules/test/package.json"
+                " && test -f node_modules/test/index.js"
+                " && test ! -e node_modules/test/README.md"
+                " && test ! -e node_modules/test/docs",
+                return_output=False,
+            )
+            == 0
+        )
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(
+            url=f"http://{cip}", expected_output="Hello from a package named test!"
+        )
+
+
+class TestNodeJSNpmCachePersistAppContainer:
+    """
+    Test NPM_CACHE_MODE=persist of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.build1 = build_s2i_app(
+            test_lockfile, container_args="-e NPM_CACHE_MODE=persist"
+        )
+        self.build2 = build_s2i_app(
+            test_lockfile, container_args="-e NPM_CACHE_MODE=persist --incremental"
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.build1.cleanup()
+        self.build2.cleanup()
+
+    def test_npm_cache_persisted(self):
+        """
+        Test that the npm cache is kept in the image and restored
+        by the incremental build.
+        """
+        skip_for_minimal()
+        assert "Restoring the npm cache" not in self.build1.get_podman_build_log_file()
+        assert "Restoring the npm cache" in self.build2.get_podman_build_log_file()
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.build2.image_name,
+                cmd='test -d "$(npm config get cache)/_cacache/content-v2"',
+                return_output=False,
+            )
+            == 0
+        )
+
+
+class TestNodeJSBinaryAppContainer:
+    """
+    Test a NodeJS application with native addons.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        skip_for_minimal()
+        if VARS.VERSION == "22" and VARS.OS in ("c10s", "rhel10"):
+            pytest.skip("openssl-devel-engine needed by node-rdkafka is deprecated")
+        self.s2i_app = get_s2i_app(
+            test_binary, container_args="-e CI=true -e NATIVE_BUILD_JOBS=2"
+        )
+        self.s2i_lockfile_app = None
+        self.app_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+        if self.s2i_lockfile_app:
+            self.s2i_lockfile_app.cleanup()
+        shutil.rmtree(self.app_dir)
+
+    def test_run_binary_application(self):
+        """
+        Test the native addons are compiled in parallel and the application runs.
+        """
+        build_log = self.s2i_app.get_podman_build_log_file()
+        assert "---> Compiled native addons with 2 jobs" in build_log
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+
+    def test_native_addons_rebuilt_for_other_abi(self):
+        """
+        Test the native addons of node_modules restored from a build with another
+        Node.js ABI are rebuilt instead of reinstalling all the dependencies.
+        """
+        output = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="mkdir -p /tmp/artifacts/.s2i /tmp/src"
+            " && echo 0-unknown > /tmp/artifacts/.s2i/node-abi"
+            " && mv node_modules /tmp/artifacts/"
+            " && cp binary.js package.json /tmp/src/"
+            " && /usr/libexec/s2i/assemble 2>&1"
+            " && node -e \"require(\\\"node-rdkafka\\\")\" && echo Loaded node-rdkafka",
+        )
+        assert (
+            "---> Restored dependencies were built for Node.js ABI 0-unknown, "
+            "rebuilding the native addons" in output
+        )
+        assert "Loaded node-rdkafka" in output
+
+    def test_native_addons_rebuilt_for_other_abi_with_lockfile(self):
+        """
+        Test the native addons of node_modules restored from a build with another
+        Node.js ABI, but from the same lockfile, are rebuilt without running
+        any install.
+        """
+        # Build the application again with the lockfile npm wrote for it, so
+        # that the image records the dependencies hash of that lockfile
+        app_path = Path(self.app_dir) / "test-binary-lockfile"
+        shutil.copytree(test_binary, app_path)
+        (app_path / "package-lock.json").write_text(
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_app.image_name,
+                cmd="cat node_modules/.package-lock.json",
+            )
+        )
+        os.chmod(self.app_dir, 0o755)
+        os.chmod(app_path, 0o755)
+        self.s2i_lockfile_app = build_s2i_app(
+            app_path,
+            container_args="-e CI=true -e NATIVE_BUILD_JOBS=2",
+            dst_image=f"{VARS.IMAGE_NAME}-test-binary-lockfile{VARS.WORKER_SUFFIX}",
+        )
+        # Assemble the same sources again, with the dependencies of that build
+        # handed over as if they came from a Node.js with another ABI
+        output = PodmanCLIWrapper.call_podman_command(
+            f"run --rm -v {app_path}:/tmp/app:Z {self.s2i_lockfile_app.image_name} "
+            "/bin/bash -c 'mkdir -p /tmp/artifacts/.s2i /tmp/src"
+            " && cp -r /tmp/app/. /tmp/src/"
+            " && cp .s2i/dependencies-hash /tmp/artifacts/.s2i/"
+            " && echo 0-unknown > /tmp/artifacts/.s2i/node-abi"
+            " && mv node_modules /tmp/artifacts/"
+            " && /usr/libexec/s2i/assemble 2>&1"
+            " && node -e \"require(\\\"node-rdkafka\\\")\" && echo Loaded node-rdkafka'"
+        )
+        assert "---> Restored dependencies match the lockfile, reusing them" in output
+        assert (
+            "---> Restored dependencies were built for Node.js ABI 0-unknown, "
+            "rebuilding the native addons" in output
+        )
+        assert not re.search(r"---> Installing (all|production) dependencies", output)
+        assert "---> Building your Node application from source" not in output
+        assert "Loaded node-rdkafka" in output
+
+
+class TestNodeJSNativeAddonCacheAppContainer:
+    """
+    Test NATIVE_ADDON_CACHE of a NodeJS application with native addons.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        skip_for_minimal()
+        if VARS.VERSION == "22" and VARS.OS in ("c10s", "rhel10"):
+            pytest.skip("openssl-devel-engine needed by node-rdkafka is deprecated")
+        # Both builds share the cache through a volume
+        self.cache_dir = tempfile.mkdtemp()
+        os.chmod(self.cache_dir, 0o777)
+        container_args = (
+            "-e CI=true -e NATIVE_ADDON_CACHE=true "
+            "-e NATIVE_ADDON_CACHE_DIR=/tmp/native-addon-cache "
+            f"-v {self.cache_dir}:/tmp/native-addon-cache:Z"
+        )
+        self.s2i_app = build_s2i_app(test_binary, container_args=container_args)
+        self.s2i_cached_app = build_s2i_app(
+            test_binary,
+            container_args=container_args,
+            dst_image=f"{VARS.IMAGE_NAME}-test-binary-cached{VARS.WORKER_SUFFIX}",
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+        self.s2i_cached_app.cleanup()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_native_addon_cached(self):
+        """
+        Test the native addon compiled by the first build is stored in the
+        cache, and copied from it by the second build instead of compiling it.
+        """
+        build_log = self.s2i_app.get_podman_build_log_file()
+        assert "---> Caching the native addon of node-rdkafka@" in build_log
+        assert "---> Compiled native addons with" in build_log
+        cached_build_log = self.s2i_cached_app.get_podman_build_log_file()
+        assert "---> Using the cached native addon of node-rdkafka@" in cached_build_log
+        # Nothing was compiled by the second build
+        assert "---> Compiled native addons with" not in cached_build_log
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_cached_app.image_name,
+                cmd="node -e \"require(\\\"node-rdkafka\\\")\"",
+                return_output=False,
+            )
+            == 0
+        )
+        assert self.s2i_cached_app.create_container(
+            cid_file_name=self.s2i_cached_app.app_name, container_args="--user 100001"
+        )
+        cip = self.s2i_cached_app.get_cip(cid_file_name=self.s2i_cached_app.app_name)
+        assert cip
+        assert self.s2i_cached_app.test_response(url=f"http://{cip}")
+
+    def test_native_addon_cache_artifacts(self):
+        """
+        Test save-artifacts hands the cache over without renaming the other artifacts.
+        """
+        output = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="mkdir -p \"$NATIVE_ADDON_CACHE_DIR/entry\""
+            " && /usr/libexec/s2i/save-artifacts | tar -tf -",
+        )
+        members = output.split()
+        assert ".s2i/node-abi" in members
+        assert ".native-addon-cache/entry/" in members
+        assert not [m for m in members if m.startswith(".native-addon-caches2i")]
+
+    def test_native_addon_cache_default_dir(self):
+        """
+        Test the cache defaults to a directory outside of the application, which
+        save-artifacts hands over as well.
+        """
+        output = PodmanCLIWrapper.podman_run_command_and_remove(
+            cid_file_name=self.s2i_app.image_name,
+            cmd="unset NATIVE_ADDON_CACHE_DIR"
+            " && mkdir -p /opt/app-root/.native-addon-cache/entry"
+            " && /usr/libexec/s2i/save-artifacts | tar -tf -",
+        )
+        assert ".native-addon-cache/entry/" in output.split()
+
+
+class TestNodeJSSnapshotAppContainer:
+    """
+    Test NODE_SNAPSHOT_ENTRY of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(
+            test_snapshot, container_args="-e NODE_SNAPSHOT_ENTRY=server.js"
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    @pytest.mark.parametrize("init_wrapper", ["true", "false"])
+    def test_run_from_snapshot(self, init_wrapper):
+        """
+        Test the application is started from the snapshot built by assemble.
+        """
+        assert "---> Building a startup snapshot of server.js" in (
+            self.s2i_app.get_podman_build_log_file()
+        )
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 -e INIT_WRAPPER={init_wrapper}",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(
+            url=f"http://{cip}", expected_output="Started from a startup snapshot"
+        )
+        logs = self.s2i_app.get_logs(self.s2i_app.app_name)
+        assert re.search("Launching from the startup snapshot", logs)
+
+
+class TestNodeJSCompileCacheAppContainer:
+    """
+    Test NODE_COMPILE_CACHE_WARMUP of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(
+            test_bin_start, container_args="-e NODE_COMPILE_CACHE_WARMUP=true"
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_warmup_with_bin_start_command(self):
+        """
+        Test the warm-up finds the start command in node_modules/.bin, as run
+        does, and fills the compile cache.
+        """
+        build_log = self.s2i_app.get_podman_build_log_file()
+        assert "---> Warming up the Node.js compile cache" in build_log
+        assert "The application exited with an error during the warm-up" not in build_log
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_app.image_name,
+                cmd="test -n \"$(ls -A .s2i/compile-cache)\"",
+                return_output=False,
+            )
+            == 0
+        )
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args="--user 100001 -e NPM_RUN_DIRECT=true",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(
+            url=f"http://{cip}", expected_output="Started by start-server"
+        )
 
 
 class TestNodeJSAuthenticationTokenAppContainer:
@@ -502,7 +1372,7 @@ class TestNodeJSAuthenticationTokenAppContainer:
         """
         Setup the test environment.
         """
-        self.s2i_app = build_s2i_app(
+        self.s2i_app = get_s2i_app(
             test_app, container_args="-e NPM_TOKEN=some-token-for-testing"
         )
 
@@ -530,7 +1400,7 @@ class TestNodeJSAuthenticationTokenAppContainer:
         )
         NPM_REGISTRY_AUTH = f"//{INTERNAL_NPM_REGISTRY}:_auth"
         npm_config_list = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="npm config list",
         )
         pattern = rf"{NPM_REGISTRY_AUTH}\s*=\s*\(protected\)"
@@ -543,7 +1413,7 @@ class TestNodeJSAuthenticationTokenAppContainer:
                 f"Auth registry {NPM_REGISTRY_AUTH} not found in npm config list"
             )
         npmrc_file = PodmanCLIWrapper.podman_run_command_and_remove(
-            cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_app.app_name}",
+            cid_file_name=self.s2i_app.image_name,
             cmd="cat .npmrc",
         ).strip()
         pattern_file = rf"{NPM_REGISTRY_AUTH}=some-token-for-testing"
@@ -5,27 +5,12 @@ from pathlib import Path
 from container_ci_suite.container_lib import ContainerTestLib, PodmanCLIWrapper
 from container_ci_suite.utils import get_file_content
 
-from conftest import VARS, skip_for_minimal
+from conftest import VARS, get_s2i_app, skip_for_minimal
 
 
 test_fips = VARS.TEST_DIR / "test-fips"
 
 
-def build_s2i_app(app_path: Path) -> ContainerTestLib:
-    """
-    Build a S2I application.
-    """
-    container_lib = ContainerTestLib(VARS.IMAGE_NAME)
-    app_name = app_path.name
-    s2i_app = container_lib.build_as_df(
-        app_path=app_path,
-        s2i_args=f"--pull-policy=never {container_lib.build_s2i_npm_variables()}",
-        src_image=VARS.IMAGE_NAME,
-        dst_image=f"{VARS.IMAGE_NAME}-{app_name}",
-    )
-    return s2i_app
-
-
 class TestNodeJSAppContainer:
     """
     Test NodeJS app of a NodeJS application.
@@ -80,9 +65,10 @@ class TestNodeJSAppContainer:
             app_url="https://github.com/sclorg/nodejs-ex.git",
             app_dir="app-src",
             build_args="--ulimit nofile=4096:4096",
+            app_image_name=f"app_dockerfile{VARS.WORKER_SUFFIX}",
         )
         assert self.app.test_app_dockerfile()
-        cip = self.app.get_cip()
+        cip = self.app.get_cip(cid_file_name=f"app_dockerfile{VARS.WORKER_SUFFIX}")
         assert cip
         assert self.app.test_response(
             url=cip, expected_output="Node.js Crud Application"
@@ -98,7 +84,7 @@ class TestNodeJSFipsContainer:
         """
         Setup the test environment.
         """
-        self.s2i_fips = build_s2i_app(test_fips)
+        self.s2i_fips = get_s2i_app(test_fips)
 
     def teardown_method(self):
         """
@@ -119,14 +105,14 @@ class TestNodeJSFipsContainer:
             is_fips_enabled = int(get_file_content(fips_enabled_file))
         if is_fips_enabled == 1:
             fips_result = PodmanCLIWrapper.podman_run_command_and_remove(
-                cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_fips.app_name}",
+                cid_file_name=self.s2i_fips.image_name,
                 cmd="node test.js",
                 return_output=False,
             )
             assert fips_result == 1
         else:
             fips_mode = PodmanCLIWrapper.podman_run_command_and_remove(
-                cid_file_name=f"{VARS.IMAGE_NAME}-{self.s2i_fips.app_name}",
+                cid_file_name=self.s2i_fips.image_name,
                 cmd="node test.js",
                 return_output=False,
             )
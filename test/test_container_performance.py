@@ -0,0 +1,473 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import urllib.request
+
+import pytest
+
+from container_ci_suite.container_lib import ContainerTestLib
+from container_ci_suite.engines.podman_wrapper import PodmanCLIWrapper
+
+from conftest import VARS, build_s2i_app, get_s2i_app, measure_load, skip_for_minimal
+
+
+test_app = VARS.TEST_DIR / "test-app"
+test_lockfile = VARS.TEST_DIR / "test-lockfile"
+test_express_webapp = VARS.TEST_DIR / "test-express-webapp"
+test_many_files = VARS.TEST_DIR / "test-many-files"
+
+# The incremental build has to be at least this many times faster than the cold one
+INCREMENTAL_SPEEDUP_RATIO = float(os.getenv("INCREMENTAL_SPEEDUP_RATIO", "1.0"))
+# Fixing the permissions in assemble has to be at least this many times faster
+# than running fix-permissions on the whole application twice
+FIX_PERMISSIONS_SPEEDUP_RATIO = float(os.getenv("FIX_PERMISSIONS_SPEEDUP_RATIO", "1.0"))
+# Requests sent by the load tests and how many of them at a time: enough for
+# stable percentiles, at the concurrency of a few busy clients
+LOAD_TEST_REQUESTS = int(os.getenv("LOAD_TEST_REQUESTS", "2000"))
+LOAD_TEST_CONCURRENCY = int(os.getenv("LOAD_TEST_CONCURRENCY", "20"))
+# Seconds after which a single request counts as an error
+LOAD_TEST_TIMEOUT = float(os.getenv("LOAD_TEST_TIMEOUT", "10"))
+# The limits the applications have to stay within. The hello world test apps
+# answer in milliseconds, so these only catch a broken or stalled start mode
+# even on slow shared CI runners; tighten them to compare setups on real hardware.
+LOAD_TEST_MAX_P99_MS = float(os.getenv("LOAD_TEST_MAX_P99_MS", "1000"))
+LOAD_TEST_MIN_THROUGHPUT = float(os.getenv("LOAD_TEST_MIN_THROUGHPUT", "50"))
+
+# Markers printed by the assemble script at the beginning of each phase
+ASSEMBLE_PHASES = {
+    "restore": ["---> Restoring previous build artifacts"],
+    "install": [
+        "---> Installing all dependencies",
+        "---> Installing production dependencies",
+        "---> Building your Node application from source",
+    ],
+    "build": ["---> Building in production mode"],
+    "prune": ["---> Pruning the development dependencies"],
+    "cleanup": ["---> Cleaning the"],
+}
+
+
+def assemble_timings(build_log: str) -> dict:
+    """
+    Return the duration in milliseconds of each assemble phase, as reported
+    by the assemble script when S2I_TIMINGS is enabled.
+    """
+    timings = re.search(r"---> Build timings: (.*)", build_log)
+    assert timings, "The build log contains no build timings"
+    return {
+        phase["name"]: phase["duration_ms"]
+        for phase in json.loads(timings.group(1))["phases"]
+    }
+
+
+def assemble_phases(build_log: str) -> list:
+    """
+    Return the assemble phases that were run, in order, parsed from the build log.
+    """
+    phases = []
+    for line in build_log.splitlines():
+        marker = re.search(r"--->.*", line)
+        if not marker:
+            continue
+        for phase, prefixes in ASSEMBLE_PHASES.items():
+            if marker.group().startswith(tuple(prefixes)) and phase not in phases:
+                phases.append(phase)
+    return phases
+
+
+def start_app(s2i_app, cid_file_name: str, container_args: str) -> tuple:
+    """
+    Start a container of the application and return the seconds until it
+    answered its first request, with the memory used by the container in bytes.
+    """
+    start = time.monotonic()
+    assert s2i_app.create_container(
+        cid_file_name=cid_file_name, container_args=container_args
+    )
+    cip = s2i_app.get_cip(cid_file_name=cid_file_name)
+    assert cip
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://{cip}:8080", timeout=1):
+                break
+        except OSError:
+            assert time.monotonic() - start < 60, "The application did not start"
+            time.sleep(0.05)
+    startup_time = time.monotonic() - start
+    memory = PodmanCLIWrapper.podman_exec_shell_command(
+        cid_file_name=s2i_app.get_cid(cid_file_name),
+        cmd="cat /sys/fs/cgroup/memory.current 2>/dev/null"
+        " || cat /sys/fs/cgroup/memory/memory.usage_in_bytes",
+    )
+    return startup_time, int(memory.strip())
+
+
+class TestNodeJSIncrementalBuildBenchmark:
+    """
+    Benchmark the incremental build of a NodeJS application.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        start = time.monotonic()
+        self.cold_build = build_s2i_app(
+            test_lockfile, container_args="-e S2I_TIMINGS=1"
+        )
+        self.cold_time = time.monotonic() - start
+        start = time.monotonic()
+        self.incremental_build = build_s2i_app(
+            test_lockfile, container_args="-e S2I_TIMINGS=1 --incremental"
+        )
+        self.incremental_time = time.monotonic() - start
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.cold_build.cleanup()
+        self.incremental_build.cleanup()
+
+    def test_incremental_build_is_faster(self):
+        """
+        Test that the incremental build reuses the artifacts
+        and is faster than the cold build.
+        """
+        skip_for_minimal()
+        cold_log = self.cold_build.get_podman_build_log_file()
+        incremental_log = self.incremental_build.get_podman_build_log_file()
+        cold_phases = assemble_phases(cold_log)
+        incremental_phases = assemble_phases(incremental_log)
+        cold_timings = assemble_timings(cold_log)
+        incremental_timings = assemble_timings(incremental_log)
+        print(f"Cold build: {self.cold_time:.1f}s, phases (ms): {cold_timings}")
+        print(
+            f"Incremental build: {self.incremental_time:.1f}s, "
+            f"phases (ms): {incremental_timings}"
+        )
+        assert "restore" not in cold_phases
+        assert "install" in cold_phases
+        assert "restore" in incremental_phases
+        assert "install" not in incremental_phases
+        cold_assemble = sum(cold_timings.values())
+        incremental_assemble = sum(incremental_timings.values())
+        assert incremental_assemble * INCREMENTAL_SPEEDUP_RATIO <= cold_assemble
+
+
+class TestNodeJSFixPermissionsBenchmark:
+    """
+    Benchmark fixing the permissions of an application with many files.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = build_s2i_app(test_many_files, container_args="-e S2I_TIMINGS=1")
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_fix_permissions(self):
+        """
+        Test the permissions of a synthetic node_modules of 100000 files are
+        fixed faster than by running fix-permissions twice on the whole tree.
+        """
+        permissions_ms = assemble_timings(self.s2i_app.get_podman_build_log_file())[
+            "permissions"
+        ]
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_app.image_name,
+                cmd="test -z \"$(find . \\! -perm -g+rw -print -quit)\"",
+                return_output=False,
+            )
+            == 0
+        )
+        # Break the permissions of the very same tree again, then time the
+        # two full fix-permissions runs assemble used to do
+        fix_permissions_ms = int(
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_app.image_name,
+                cmd="chmod -R g-w node_modules/.synthetic && start=$(date +%s%3N)"
+                " && fix-permissions ./ && fix-permissions ./"
+                " && echo $(( $(date +%s%3N) - start ))",
+            ).strip().splitlines()[-1]
+        )
+        print(f"assemble: {permissions_ms}ms, fix-permissions twice: {fix_permissions_ms}ms")
+        assert permissions_ms * FIX_PERMISSIONS_SPEEDUP_RATIO <= fix_permissions_ms
+
+
+class TestNodeJSStartupBenchmark:
+    """
+    Compare starting a NodeJS application through npm and directly.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(test_app)
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+
+    def test_npm_run_direct(self):
+        """
+        Test that running the start script directly does not keep npm
+        around and needs less memory than running it through npm.
+        """
+        npm_time, npm_memory = start_app(
+            self.s2i_app, "npm", "--user 100001 -e NPM_RUN_DIRECT=false"
+        )
+        direct_time, direct_memory = start_app(
+            self.s2i_app, "direct", "--user 100001 -e NPM_RUN_DIRECT=true"
+        )
+        print(f"npm run: {npm_time * 1000:.0f}ms, {npm_memory // 1024}KiB")
+        print(f"Direct: {direct_time * 1000:.0f}ms, {direct_memory // 1024}KiB")
+        assert "npm" not in PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=self.s2i_app.get_cid("direct"),
+            cmd="tr \"\\0\" \" \" < /proc/1/cmdline",
+        )
+        assert direct_memory < npm_memory
+
+
+class TestNodeJSCompileCacheBenchmark:
+    """
+    Compare the cold start of a NodeJS application with and without
+    the compile cache warmed up during the build.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = get_s2i_app(test_app)
+        self.s2i_warm_app = get_s2i_app(
+            test_app, container_args="-e NODE_COMPILE_CACHE_WARMUP=true"
+        )
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        self.s2i_app.cleanup()
+        self.s2i_warm_app.cleanup()
+
+    def test_compile_cache_warmup(self):
+        """
+        Test the compile cache is filled during the build and used at runtime,
+        and report the time to the first response with and without it.
+        """
+        assert "Warming up the Node.js compile cache" in (
+            self.s2i_warm_app.get_podman_build_log_file()
+        )
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.s2i_warm_app.image_name,
+                cmd="test -n \"$(ls -A .s2i/compile-cache)\"",
+                return_output=False,
+            )
+            == 0
+        )
+        cold_time, _ = start_app(self.s2i_app, "cold", "--user 100001")
+        warm_time, _ = start_app(self.s2i_warm_app, "warm", "--user 100001")
+        print(f"Without compile cache: {cold_time * 1000:.0f}ms")
+        print(f"With compile cache: {warm_time * 1000:.0f}ms")
+        assert "NODE_COMPILE_CACHE=" in PodmanCLIWrapper.podman_exec_shell_command(
+            cid_file_name=self.s2i_warm_app.get_cid("warm"),
+            cmd="tr \"\\0\" \"\\n\" < /proc/1/environ",
+        )
+
+
+def image_size(image_name: str) -> int:
+    """
+    Return the size of the image in bytes.
+    """
+    return int(
+        PodmanCLIWrapper.call_podman_command(
+            f"image inspect --format '{{{{.Size}}}}' {image_name}"
+        ).strip()
+    )
+
+
+class TestNodeJSSlimImageBenchmark:
+    """
+    Compare the size of a NodeJS application image with and without NPM_SLIM.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_apps = []
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        for s2i_app in self.s2i_apps:
+            s2i_app.cleanup()
+
+    @pytest.mark.parametrize("app_path", [test_app, test_express_webapp])
+    def test_slim_image_size(self, app_path):
+        """
+        Test the files not needed at runtime are removed from node_modules
+        without breaking the application, and report the image size delta.
+        """
+        s2i_app = get_s2i_app(app_path)
+        s2i_slim_app = get_s2i_app(app_path, container_args="-e NPM_SLIM=true")
+        self.s2i_apps = [s2i_app, s2i_slim_app]
+        assert "---> Removing the files not needed at runtime" in (
+            s2i_slim_app.get_podman_build_log_file()
+        )
+        size = image_size(s2i_app.image_name)
+        slim_size = image_size(s2i_slim_app.image_name)
+        print(
+            f"{app_path.name}: {size // 1024}KiB, with NPM_SLIM: {slim_size // 1024}KiB "
+            f"({(slim_size - size) // 1024}KiB)"
+        )
+        assert slim_size <= size
+        assert s2i_slim_app.create_container(
+            cid_file_name=s2i_slim_app.app_name, container_args="--user 100001"
+        )
+        cip = s2i_slim_app.get_cip(cid_file_name=s2i_slim_app.app_name)
+        assert cip
+        assert s2i_slim_app.test_response(url=f"http://{cip}")
+
+
+class TestNodeJSMultistageMinimalBenchmark:
+    """
+    Compare a NodeJS application built and run on the full-sized image with
+    the same application built on it and copied into the minimal image by
+    examples/from-dockerfile/Dockerfile.minimal.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        if not VARS.IS_MINIMAL:
+            pytest.skip("This test is only available for NodeJS minimal container")
+        self.app_dir = tempfile.mkdtemp()
+        shutil.copy(
+            VARS.TEST_DIR / "examples/from-dockerfile/Dockerfile.minimal",
+            self.app_dir,
+        )
+        shutil.copytree(test_express_webapp, f"{self.app_dir}/app-src")
+        self.apps = {}
+        for name, target in [("builder", "--target builder"), ("minimal", "")]:
+            image_name = f"{VARS.IMAGE_NAME}-multistage-{name}{VARS.WORKER_SUFFIX}"
+            app = ContainerTestLib(image_name=image_name)
+            assert app.build_image_and_parse_id(
+                dockerfile=f"{self.app_dir}/Dockerfile.minimal",
+                build_params=f"--build-arg BUILDER_IMAGE={VARS.FULL_IMAGE} "
+                f"--build-arg RUNTIME_IMAGE={VARS.IMAGE_NAME} {target} "
+                f"-t {image_name} {self.app_dir}",
+            )
+            self.apps[name] = app
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        if not VARS.IS_MINIMAL:
+            return
+        for app in self.apps.values():
+            app.cleanup()
+            PodmanCLIWrapper.call_podman_command(
+                f"rmi -f {app.image_name}", ignore_error=True
+            )
+        shutil.rmtree(self.app_dir)
+
+    def test_multistage_minimal(self):
+        """
+        Test the application runs in the minimal image without the compilers
+        and the npm cache of the builder, and report the image size and cold
+        start of both images.
+        """
+        results = {}
+        for name, app in self.apps.items():
+            startup_time, memory = start_app(app, name, "--user 100001")
+            results[name] = (image_size(app.image_name), startup_time, memory)
+            print(
+                f"{name}: {results[name][0] // 1024}KiB image, "
+                f"{startup_time * 1000:.0f}ms to the first response, {memory // 1024}KiB"
+            )
+        assert (
+            PodmanCLIWrapper.podman_run_command_and_remove(
+                cid_file_name=self.apps["minimal"].image_name,
+                cmd="! command -v gcc && test -d node_modules && test ! -d .npm/_cacache",
+                return_output=False,
+            )
+            == 0
+        )
+        assert results["minimal"][0] < results["builder"][0]
+
+
+class TestNodeJSLoadBenchmark:
+    """
+    Measure the latency and throughput of NodeJS applications under load.
+    """
+
+    def setup_method(self):
+        """
+        Setup the test environment.
+        """
+        self.s2i_app = None
+
+    def teardown_method(self):
+        """
+        Cleanup the test environment.
+        """
+        if self.s2i_app:
+            self.s2i_app.cleanup()
+
+    @pytest.mark.parametrize("app_path", [test_app, test_express_webapp])
+    @pytest.mark.parametrize(
+        "s2i_args,container_args",
+        [
+            ("", ""),
+            ("", "-e INIT_WRAPPER=true"),
+            ("", "--memory=512m -e NODE_HEAP_SIZE_PERCENT=75"),
+            ("", "-e NODE_CLUSTER_WORKERS=2"),
+            ("-e DEV_MODE=true", ""),
+        ],
+    )
+    def test_load(self, app_path, s2i_args, container_args):
+        """
+        Test the application serves concurrent requests without errors and
+        within the latency and throughput limits.
+        """
+        self.s2i_app = get_s2i_app(app_path, container_args=s2i_args)
+        assert self.s2i_app.create_container(
+            cid_file_name=self.s2i_app.app_name,
+            container_args=f"--user 100001 {container_args}",
+        )
+        cip = self.s2i_app.get_cip(cid_file_name=self.s2i_app.app_name)
+        assert cip
+        assert self.s2i_app.test_response(url=f"http://{cip}")
+        result = measure_load(
+            cip,
+            requests=LOAD_TEST_REQUESTS,
+            concurrency=LOAD_TEST_CONCURRENCY,
+            timeout=LOAD_TEST_TIMEOUT,
+        )
+        print(
+            f"{app_path.name} {f'{s2i_args} {container_args}'.strip() or '(defaults)'}: "
+            f"{result.throughput:.0f} req/s, p50 {result.p50:.1f}ms, "
+            f"p95 {result.p95:.1f}ms, p99 {result.p99:.1f}ms, {result.errors} errors"
+        )
+        assert result.errors == 0
+        assert result.p99 <= LOAD_TEST_MAX_P99_MS
+        assert result.throughput >= LOAD_TEST_MIN_THROUGHPUT